@@ -1,9 +1,17 @@
 # trade_dashboard.py
+import csv
+import hashlib
+import io
+import os
+import tempfile
+from datetime import date, timedelta
 from pathlib import Path
 import numpy as np
 import pandas as pd
 import plotly.express as px
+import pyarrow as pa
 import streamlit as st
+from pyarrow import csv as pacsv
 
 st.set_page_config(page_title="TopstepX Trade Dashboard", layout="wide")
 
@@ -13,22 +21,79 @@ DEFAULT_PATHS = [
     DATA_DIR / "trades.csv",
     Path(__file__).parent / "TOPSTEP_TRADE_DATA 0425-09-25.csv",
 ]
+DATE_COLS = ["EnteredAt", "ExitedAt", "TradeDay"]
+# Columns the dashboard reads or shows; anything else in the export is never parsed
+USECOLS = [
+    "Id", "ContractName", "EnteredAt", "ExitedAt", "EntryPrice", "ExitPrice",
+    "Fees", "PnL", "Size", "Type", "TradeDay", "TradeDuration",
+]
+PREP_VERSION = 7  # bump when _prep output changes so stale Parquet caches are ignored
+
+def _read_csv(raw: bytes) -> pa.Table:
+    # Arrow's multithreaded parser; date columns stay strings so _prep keeps the
+    # export's UTC offset (Arrow would normalize "-05:00" stamps to UTC).
+    header = next(csv.reader([raw.split(b"\n", 1)[0].decode("utf-8-sig").rstrip("\r")]), [])
+    include = [c for c in USECOLS if c in header]
+    if "EnteredAt" in header and "ExitedAt" in header:
+        include = [c for c in include if c != "TradeDuration"]  # _prep recomputes it
+    opts = pacsv.ConvertOptions(
+        column_types={c: pa.string() for c in DATE_COLS},
+        include_columns=include,
+        # blank cells become nulls, as they were NaN under pd.read_csv
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=True,
+    )
+    return pacsv.read_csv(io.BytesIO(raw), convert_options=opts)
+
+def _digest(raw: bytes) -> str:
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
 
-@st.cache_data
-def load_csv(path: Path) -> pd.DataFrame:
-    df = pd.read_csv(path)
-    return _prep(df)
+def _write_parquet_cache(df: pd.DataFrame, cache: Path) -> None:
+    # Write to a temp file and rename so a killed or concurrent write never
+    # leaves a truncated cache behind; then drop every other prepared frame
+    # (older PREP_VERSIONs, earlier contents of the default file).
+    tmp = None
+    try:
+        DATA_DIR.mkdir(exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=DATA_DIR, prefix=".prep_", suffix=".parquet", delete=False) as f:
+            tmp = Path(f.name)
+        df.to_parquet(tmp, compression="zstd")
+        os.replace(tmp, cache)
+        for old in DATA_DIR.glob("prep_*.parquet"):
+            if old != cache:
+                old.unlink(missing_ok=True)
+    except (OSError, ValueError):
+        # read-only checkout or a column Parquet can't hold; recompute next time
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+
+@st.cache_data(show_spinner=False)
+def _prep_from_bytes(raw: bytes, persist: bool = False) -> tuple[pd.DataFrame, str]:
+    # Keyed by the CSV's content, so a repeat load (default file or re-upload)
+    # skips parsing and _prep. With persist=True (default files only; uploads
+    # stay in memory) the prepared frame is also kept on disk as Parquet for
+    # cold starts. The digest is returned too and keys the downstream caches.
+    key = _digest(raw)
+    cache = DATA_DIR / f"prep_v{PREP_VERSION}_{key}.parquet"
+    if persist and cache.exists():
+        try:
+            return pd.read_parquet(cache), key
+        except (OSError, ValueError):
+            cache.unlink(missing_ok=True)  # unreadable cache; rebuild it below
+    df = _prep(_read_csv(raw).to_pandas())
+    if persist:
+        _write_parquet_cache(df, cache)
+    return df, key
 
-@st.cache_data
 def _prep(df: pd.DataFrame) -> pd.DataFrame:
     # Normalize columns used below
-    for c in ["EnteredAt", "ExitedAt", "TradeDay"]:
+    for c in DATE_COLS:
         if c in df.columns:
             df[c] = pd.to_datetime(df[c], errors="coerce")
-    if "PnL" in df.columns:
-        df["PnL"] = pd.to_numeric(df["PnL"], errors="coerce")
-    if "Fees" in df.columns:
-        df["Fees"] = pd.to_numeric(df["Fees"], errors="coerce")
+    # Arrow already types clean numeric columns; only coerce the ones it left as text
+    for c in ["PnL", "Fees"]:
+        if c in df.columns and not pd.api.types.is_numeric_dtype(df[c]):
+            df[c] = pd.to_numeric(df[c], errors="coerce")
     # Derived
     if "EnteredAt" in df.columns and "ExitedAt" in df.columns:
         df["TradeDuration"] = (df["ExitedAt"] - df["EnteredAt"]).dt.total_seconds()
@@ -38,18 +103,138 @@ def _prep(df: pd.DataFrame) -> pd.DataFrame:
         df["NetPnL"] = df.get("PnL", pd.Series(np.nan, index=df.index))
     if "TradeDay" not in df.columns and "EnteredAt" in df.columns:
         df["TradeDay"] = df["EnteredAt"].dt.floor("D")
+    # Narrow dtypes where precision allows; money columns stay float64 so
+    # cents and running sums display exactly
+    if "TradeDuration" in df.columns and pd.api.types.is_float_dtype(df["TradeDuration"]):
+        df["TradeDuration"] = df["TradeDuration"].astype("float32")
+    if "Size" in df.columns and pd.api.types.is_integer_dtype(df["Size"]):
+        df["Size"] = df["Size"].astype("int32")
+    # Few distinct contracts: int codes make unique/isin/grouping cheap
+    if "ContractName" in df.columns:
+        df["ContractName"] = df["ContractName"].astype("category")
+    # Chronological order once here: the date filter slices with searchsorted
+    # and the drawdown chart walks trades in order without re-sorting.
+    order = [c for c in ("TradeDay", "EnteredAt") if c in df.columns]
+    if order:
+        df = df.sort_values(order, kind="mergesort", na_position="last").reset_index(drop=True)
     return df
 
+def _equity_stats(pnl: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Cumulative P&L, running peak and drawdown for trades in chronological order."""
+    equity = np.cumsum(np.nan_to_num(pnl))
+    # the peak starts at the 0 opening balance, so an opening loss is drawdown too
+    peak = np.maximum.accumulate(np.maximum(equity, 0.0))
+    return equity, peak, equity - peak
+
+# Each entry is a slice of the full frame, so keep only recent selections
+@st.cache_data(show_spinner=False, max_entries=16)
+def _filter(_df: pd.DataFrame, df_key: str, start, end, chosen: tuple) -> pd.DataFrame:
+    """Rows dated within [start, end] (whole days) and, if any are chosen, in those contracts.
+
+    Cached like ``_agg_views``: ``df_key`` stands in for the unhashed ``_df``.
+    """
+    df = df_f = _df
+    if start is not None and end is not None:
+        # half-open [start, end + 1 day); _prep sorted by date with NaT last,
+        # so the non-null dates are a sorted prefix we can binary-search
+        date_col = "TradeDay" if "TradeDay" in df.columns else "EnteredAt"
+        dates = df[date_col].dt.tz_localize(None)
+        bounds = [pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta(days=1)]
+        lo, hi = dates.iloc[:dates.notna().sum()].searchsorted(bounds)
+        df_f = df_f.iloc[lo:hi]
+    if "ContractName" in df.columns and chosen:
+        df_f = df_f[df_f["ContractName"].isin(chosen)]
+    return df_f
+
+@st.cache_data(show_spinner=False)
+def _agg_views(_df: pd.DataFrame, df_key: str, start, end, chosen: tuple) -> dict[str, pd.DataFrame]:
+    """Chart-ready aggregations for one filter selection.
+
+    ``_df`` is not hashed by Streamlit; ``df_key`` (the CSV content digest)
+    identifies it, so repeat selections are a cache lookup.
+    """
+    df_f = _filter(_df, df_key, start, end, chosen)
+    views = {}
+
+    # Daily net P&L and equity curve (cumulative NetPnL over time)
+    if "NetPnL" in df_f.columns and "TradeDay" in df_f.columns:
+        daily = (
+            df_f.groupby(df_f["TradeDay"].dt.floor("D"), dropna=True)["NetPnL"]
+            .sum()
+            .rename("DailyNetPnL")
+            .to_frame()
+        )
+        daily["EquityCurve"] = daily["DailyNetPnL"].cumsum()
+        views["daily"] = daily
+
+    # Drawdown from running equity peak, trade by trade, reduced to each day's
+    # deepest point so the chart payload scales with days rather than trades
+    if "NetPnL" in df_f.columns and "TradeDay" in df_f.columns and not df_f.empty:
+        _, _, drawdown = _equity_stats(df_f["NetPnL"].to_numpy(dtype="float64", na_value=np.nan))
+        views["drawdown"] = (
+            pd.Series(drawdown, index=df_f.index, name="Drawdown")
+            .groupby(df_f["TradeDay"].dt.floor("D"), dropna=True)
+            .min()
+            .to_frame()
+        )
+
+    # Win rate by contract
+    if "PnL" in df_f.columns and "ContractName" in df_f.columns and not df_f.empty:
+        # category codes are small dense ints, so bincount replaces the hash groupby
+        contract = df_f["ContractName"].cat
+        codes = contract.codes.to_numpy()
+        pnl = df_f["PnL"].to_numpy(dtype="float64", na_value=np.nan)
+        keep = codes >= 0
+        codes, pnl = codes[keep], pnl[keep]
+        n = len(contract.categories)
+        rows = np.bincount(codes, minlength=n)
+        trades = np.bincount(codes, weights=~np.isnan(pnl), minlength=n)
+        wins = np.bincount(codes, weights=pnl > 0, minlength=n)
+        by_contract = pd.DataFrame(
+            {"trades": trades.astype("int64"), "win_rate": wins / np.maximum(rows, 1) * 100},
+            index=pd.Index(contract.categories, name="ContractName"),
+        )
+        # categories span the whole file; drop contracts filtered out of this view
+        views["contract"] = by_contract[rows > 0].sort_values("trades", ascending=False).head(15)
+
+    return views
+
+@st.cache_data(ttl=timedelta(hours=1), show_spinner=False)
+def _today() -> date:
+    # Refreshed hourly so caches keyed on it roll over with the date, not every rerun
+    return date.today()
+
+@st.cache_data(show_spinner=False)
+def _kpis(_df: pd.DataFrame, df_key: str, today: date) -> tuple[float, int, float, float]:
+    """Days opened, total trades, win rate (%) and cumulative net P&L for the loaded file."""
+    df = _df
+    # datetime64 min() skips NaT itself; only the single result becomes a date
+    first = df["TradeDay"].min() if "TradeDay" in df.columns else pd.NaT
+    if pd.isna(first) and "EnteredAt" in df.columns:
+        first = df["EnteredAt"].min()
+    baseline_date = first.date() if pd.notna(first) else None
+    days_opened = (today - baseline_date).days if baseline_date else np.nan
+    total_trades = len(df)
+    win_rate = np.nan
+    if "PnL" in df.columns:
+        # count and win tally straight off the float64 buffer (NaN > 0 is False)
+        pnl = df["PnL"].to_numpy(dtype="float64", na_value=np.nan)
+        n_valid = np.count_nonzero(~np.isnan(pnl))
+        if n_valid:
+            win_rate = np.count_nonzero(pnl > 0) / n_valid * 100
+    cum_pnl = df["NetPnL"].sum() if "NetPnL" in df.columns else np.nan
+    return days_opened, total_trades, win_rate, cum_pnl
+
 st.title("TopstepX Trade Dashboard")
 
 uploaded = st.file_uploader("Upload your trade CSV", type=["csv"])
 df = None
 if uploaded is not None:
-    df = _prep(pd.read_csv(uploaded))
+    df, df_key = _prep_from_bytes(uploaded.getvalue())
 else:
     for p in DEFAULT_PATHS:
         if p.exists():
-            df = load_csv(p)
+            df, df_key = _prep_from_bytes(p.read_bytes(), persist=True)
             st.caption(f"Loaded default data from: `{p.name}`")
             break
 
@@ -58,16 +243,7 @@ if df is None or len(df) == 0:
     st.stop()
 
 # ---------- KPIs (top row) ----------
-baseline_date = (
-    df["TradeDay"].dropna().min().date()
-    if "TradeDay" in df.columns and df["TradeDay"].notna().any()
-    else (df["EnteredAt"].dropna().dt.date.min() if "EnteredAt" in df.columns else None)
-)
-days_opened = (pd.Timestamp("today").date() - baseline_date).days if baseline_date else np.nan
-total_trades = len(df)
-wins = (df["PnL"] > 0).sum() if "PnL" in df.columns else np.nan
-win_rate = (wins / df["PnL"].notna().sum() * 100) if "PnL" in df.columns and df["PnL"].notna().any() else np.nan
-cum_pnl = df["NetPnL"].sum() if "NetPnL" in df.columns else np.nan
+days_opened, total_trades, win_rate, cum_pnl = _kpis(df, df_key, _today())
 
 c1, c2, c3, c4 = st.columns(4)
 c1.metric("Days Opened", f"{int(days_opened):,}" if pd.notna(days_opened) else "–")
@@ -100,25 +276,18 @@ with st.sidebar:
     )
 
     # Contract filter
-    contracts = sorted(df["ContractName"].dropna().unique().tolist()) if "ContractName" in df.columns else []
+    contracts = df["ContractName"].cat.categories.tolist() if "ContractName" in df.columns else []
     chosen = st.multiselect("Contracts", options=contracts, default=contracts[:5] if contracts else [])
 
 # ---------- Apply filters ----------
-mask = pd.Series(True, index=df.index)
-
-# make a tz-naive datetime Series to filter against
-dates_series = pd.to_datetime(df[date_col], errors="coerce").dt.tz_localize(None)
-
 if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
-    start = pd.to_datetime(date_range[0])
-    # include the entire end day
-    end = pd.to_datetime(date_range[1]) + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
-    mask &= dates_series.between(start, end)
-
-if "ContractName" in df.columns and chosen:
-    mask &= df["ContractName"].isin(chosen)
+    start, end = date_range
+else:
+    start = end = None
+chosen = tuple(chosen)
 
-df_f = df.loc[mask].copy()
+df_f = _filter(df, df_key, start, end, chosen)
+views = _agg_views(df, df_key, start, end, chosen)
 
 # ---------- Overview table ----------
 st.subheader("Trades Overview")
@@ -127,34 +296,20 @@ st.dataframe(df_f.head(100), use_container_width=True)
 # ---------- Charts ----------
 st.subheader("Performance")
 
-# Equity curve (cumulative NetPnL over time)
-if "NetPnL" in df_f.columns and "TradeDay" in df_f.columns:
-    daily = (
-        df_f.groupby(df_f["TradeDay"].dt.date, dropna=True)["NetPnL"]
-        .sum()
-        .rename("DailyNetPnL")
-        .to_frame()
-        .sort_index()
-    )
-    daily["EquityCurve"] = daily["DailyNetPnL"].cumsum()
-    fig_eq = px.line(daily, y="EquityCurve", labels={"index":"Date", "EquityCurve":"Equity"}, title="Equity Curve")
+if "daily" in views:
+    fig_eq = px.line(views["daily"], y="EquityCurve", labels={"index":"Date", "EquityCurve":"Equity"}, title="Equity Curve")
     st.plotly_chart(fig_eq, use_container_width=True)
 
-# Daily PnL bars
-if "NetPnL" in df_f.columns and "TradeDay" in df_f.columns:
-    fig_bar = px.bar(daily, y="DailyNetPnL", labels={"index":"Date", "DailyNetPnL":"Daily Net P&L"}, title="Daily Net P&L")
+if "drawdown" in views:
+    fig_dd = px.area(views["drawdown"], y="Drawdown", labels={"index":"Date"}, title="Drawdown")
+    st.plotly_chart(fig_dd, use_container_width=True)
+
+if "daily" in views:
+    fig_bar = px.bar(views["daily"], y="DailyNetPnL", labels={"index":"Date", "DailyNetPnL":"Daily Net P&L"}, title="Daily Net P&L")
     st.plotly_chart(fig_bar, use_container_width=True)
 
-# Win rate by contract
-if "PnL" in df_f.columns and "ContractName" in df_f.columns and not df_f.empty:
-    by_contract = (
-        df_f.assign(win=df_f["PnL"] > 0)
-        .groupby("ContractName")
-        .agg(trades=("PnL", "count"), win_rate=("win", "mean"))
-        .sort_values("trades", ascending=False)
-        .head(15)
-    )
-    by_contract["win_rate"] *= 100
+if "contract" in views:
+    by_contract = views["contract"]
     fig_wr = px.bar(by_contract, x=by_contract.index, y="win_rate",
                     labels={"x":"Contract", "win_rate":"Win Rate (%)"},
                     title="Win Rate by Contract (Top 15)")